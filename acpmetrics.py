@@ -0,0 +1,28 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from acp_sdk.server import Server
+from fastapi import FastAPI, Response
+
+from telemetry import registry
+
+# The /metrics endpoint for the ACP servers.  Kept apart from telemetry so that
+# tools which only record metrics (sqlwrite, retrieval) don't import the server stack.
+
+
+async def _metrics() -> Response:
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def mount_metrics(server: Server) -> None:
+    """Serve /metrics from the ACP server's own app, on the same host and port as its agents."""
+    lifespan = server.lifespan
+
+    # acp_sdk builds the FastAPI app inside Server.run(); its lifespan is the one hook that sees it.
+    @asynccontextmanager
+    async def with_metrics(app: FastAPI) -> AsyncIterator[None]:
+        app.add_api_route("/metrics", _metrics, methods=["GET"], include_in_schema=False)
+        async with lifespan(app):
+            yield
+
+    server.lifespan = with_metrics
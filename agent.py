@@ -1,5 +1,7 @@
 from crewai import Crew, Task, Agent, LLM
 from crewai_tools import RagTool
+from ingest import ensure_indexed
+from ragindex import with_vectordb
 
 llm = LLM(model="ollama_chat/qwen2.5:14b", base_url="http://localhost:11434", max_tokens=1024)
 config = {
@@ -17,8 +19,10 @@ config = {
     }
 }
 
-rag_tool = RagTool(config=config)
-rag_tool.add("./data/gold-hospital-and-premium-extras.pdf", data_type="pdf_file")
+POLICY_PDF = "./data/gold-hospital-and-premium-extras.pdf"
+
+rag_tool = RagTool(config=with_vectordb(config))
+ensure_indexed(rag_tool.adapter.embedchain_app.db.collection, POLICY_PDF, config)
 
 insurance_agent = Agent(
     role="Senior Insurance Coverage Assistant",
@@ -0,0 +1,151 @@
+import asyncio
+import contextvars
+import logging
+import time
+import os
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from streaming import ProgressChannel
+from timings import record
+
+logger = logging.getLogger(__name__)
+
+
+class PoolFullError(RuntimeError):
+    """Raised when more runs are waiting for a worker than the pool allows."""
+
+
+class AgentPool:
+    """
+    Runs blocking agents (smolagents' CodeAgent.run) on a bounded thread pool
+    so they never block the ACP server's event loop.
+
+    Agents are built lazily by `factory` and reused between runs; at most
+    `workers` run at once, at most `queue_depth` more wait for a slot, and each
+    run is interrupted after `timeout` seconds.
+    """
+
+    def __init__(self, factory: Callable[[], Any], workers: int = 4, queue_depth: int = 16,
+                 timeout: float | None = 120.0, name: str = "agent-pool"):
+        self.factory = factory
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(workers)
+        self._idle: deque[Any] = deque()
+        self._created = 0
+        self._waiting = 0
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls, factory: Callable[[], Any], prefix: str, **defaults: Any) -> "AgentPool":
+        """Build a pool sized by <PREFIX>_WORKERS, <PREFIX>_QUEUE_DEPTH and <PREFIX>_TIMEOUT."""
+        workers = int(os.getenv(f"{prefix}_WORKERS", defaults.pop("workers", 4)))
+        queue_depth = int(os.getenv(f"{prefix}_QUEUE_DEPTH", defaults.pop("queue_depth", 16)))
+        timeout = float(os.getenv(f"{prefix}_TIMEOUT", defaults.pop("timeout", 120.0)))
+        return cls(factory, workers=workers, queue_depth=queue_depth,
+                   timeout=timeout if timeout > 0 else None, name=prefix.lower(), **defaults)
+
+    async def stream(self, prompt: str, **kwargs: Any) -> AsyncIterator[Any]:
+        """Run `agent.run(prompt, stream=True, **kwargs)` on a pooled agent, yielding each step as it is produced."""
+        agent = await self._acquire()
+        loop = asyncio.get_running_loop()
+        channel = ProgressChannel(loop)
+
+        def work() -> None:
+            for step in agent.run(prompt, stream=True, **kwargs):
+                channel.put(step)
+
+        # Run in a copy of the caller's context so run timings recorded by the agent reach the caller.
+        future = loop.run_in_executor(self._executor, contextvars.copy_context().run, work)
+        future.add_done_callback(
+            lambda f: channel.close(None if f.cancelled() else f.exception())
+        )
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        finished = timed_out = False
+        try:
+            while True:
+                remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                try:
+                    step = await channel.get(remaining)
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    self._timeouts += 1
+                    timed_out = True
+                    raise TimeoutError(f"{self.name}: run exceeded {self.timeout}s") from None
+                yield step
+            finished = True
+        finally:
+            if finished:
+                self._release(agent, future)
+            else:
+                self._abandon(agent, future, timed_out)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "agents": self._created,
+            "busy": self._busy,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timeouts": self._timeouts,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _acquire(self) -> Any:
+        if self._waiting >= self.queue_depth and self._slots.locked():
+            self._rejected += 1
+            raise PoolFullError(f"{self.name}: {self._waiting} runs already queued")
+        self._waiting += 1
+        started = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+            record("queue", time.perf_counter() - started)
+        self._busy += 1
+        if self._idle:
+            return self._idle.pop()
+        try:
+            agent = self.factory()
+        except BaseException:
+            self._busy -= 1
+            self._slots.release()
+            raise
+        self._created += 1
+        return agent
+
+    def _release(self, agent: Any, future: asyncio.Future, counted: bool = False) -> None:
+        if not counted:
+            if future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+        self._busy -= 1
+        self._idle.append(agent)
+        self._slots.release()
+
+    def _abandon(self, agent: Any, future: asyncio.Future, timed_out: bool = False) -> None:
+        # The worker thread can't be killed; ask the agent to stop at its next
+        # step and keep its slot occupied until the thread actually returns.
+        # The run is counted now (a timeout, else a failure), not by how that thread ends.
+        if not timed_out:
+            self._failed += 1
+        interrupt = getattr(agent, "interrupt", None)
+        if interrupt is not None:
+            interrupt()
+        future.add_done_callback(lambda f: self._release(agent, f, counted=True))
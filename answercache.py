@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared computation whose leader was cancelled; a waiter takes over."""
+
+
+@dataclass
+class _Entry:
+    answer: str
+    embedding: list[float] | None
+    created: float = field(default_factory=time.monotonic)
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of final answers keyed by normalized question, with a
+    fallback embedding-similarity lookup for near-duplicates.
+
+    Concurrent misses for the same normalized question share one computation
+    (singleflight).  Entries belong to a `version` (the indexed corpus' fingerprint);
+    changing the version drops everything.  `max_entries=0` disables caching
+    and coalescing altogether, e.g. for benchmarks.
+    """
+
+    def __init__(self, embed: Callable[[str], list[float]] | None = None, max_entries: int = 512,
+                 ttl: float = 3600.0, threshold: float = 0.92, version: str = ""):
+        self.embed = embed
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = version
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_compute(self, question: str, compute: Callable[[], Awaitable[str]]) -> str:
+        if self.max_entries <= 0:
+            self.misses += 1
+            return await compute()
+        key = normalize_question(question)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.answer
+
+        coalesced = False
+        while (pending := self._inflight.get(key)) is not None:
+            if not coalesced:
+                self.coalesced += 1
+                coalesced = True
+            try:
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                continue  # the first waiter to get here becomes the new leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            version = self.version
+            embedding = await self._embed(key)
+            entry = self._nearest(embedding)
+            if entry is not None:
+                self.semantic_hits += 1
+                answer = entry.answer
+            else:
+                self.misses += 1
+                answer = await compute()
+                if version == self.version:
+                    self._put(key, _Entry(answer, embedding))
+            future.set_result(answer)
+            return answer
+        except asyncio.CancelledError:
+            # Don't cancel the waiters along with the leader: hand the question over to one of them.
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure isn't logged as "never retrieved".
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def set_version(self, version: str) -> None:
+        if version != self.version:
+            self.invalidate()
+            self.version = version
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    def _get(self, key: str) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, embedding: list[float] | None) -> _Entry | None:
+        if embedding is None:
+            return None
+        best_key, best_score = None, self.threshold
+        for key, entry in list(self._entries.items()):
+            if self._expired(entry):
+                del self._entries[key]
+                continue
+            if entry.embedding is None:
+                continue
+            score = cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key]
+
+    def _put(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl > 0 and time.monotonic() - entry.created > self.ttl
+
+    async def _embed(self, text: str) -> list[float] | None:
+        if self.embed is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.embed, text)
+        except Exception:
+            logger.warning("Question embedding failed; using exact-match cache only", exc_info=True)
+            return None
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import math
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+from acp_sdk.client import Client
+from acp_sdk.models import MessagePartEvent, RunCancelledEvent, RunCompletedEvent, RunFailedEvent
+
+from client import HOSPITAL_URL, INSURER_URL
+from streaming import parse_progress
+from workflow import pooled_client, raise_for_status
+
+# Load generator for the ACP servers.
+#
+#   python bench.py insurer --corpus requests.jsonl --concurrency 8 --requests 200
+#   python bench.py hospital --rate 2 --duration 60 --label pool-8
+#
+# Closed loop (--concurrency) keeps N runs in flight; open loop (--rate) sends
+# Poisson arrivals at R runs/s regardless of how fast the server answers, and
+# measures latency from each run's scheduled start.  Every run is streamed so
+# time-to-first-part and the server's "timing" part (queue / retrieval / llm,
+# see timings.py) are captured.  A summary is printed, appended to --out, and
+# compared against the previous result with the same label, target and load.
+#
+# For offline, repeatable numbers point the servers at mockllm.py (see its
+# header), and start the insurer with POLICY_CACHE_SIZE=0 unless the answer
+# cache is what is being measured: with a cycled corpus every repeat is a hit.
+
+logger = logging.getLogger("bench")
+
+TARGETS = {
+    "hospital": (HOSPITAL_URL, "health_agent"),
+    "insurer": (INSURER_URL, "policy_agent"),
+}
+METRICS = ("total", "ttfb", "queue", "retrieval", "llm", "other")
+
+
+def load_corpus(path: str) -> list[str]:
+    """Prompts from a .jsonl file (input / prompt / question, or title + body) or one per line of text."""
+    prompts = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            if not path.endswith(".jsonl"):
+                prompts.append(line)
+                continue
+            row = json.loads(line)
+            text = row.get("input") or row.get("prompt") or row.get("question")
+            if text is None:
+                text = ". ".join(str(row[k]) for k in ("title", "body") if row.get(k))
+            prompts.append(str(text))
+    if not prompts:
+        raise ValueError(f"No prompts in {path}")
+    return prompts
+
+
+@dataclass
+class Sample:
+    index: int
+    status: str = "completed"  # completed | failed
+    error: str | None = None
+    total: float = 0.0
+    ttfb: float | None = None
+    phases: dict[str, float] = field(default_factory=dict)
+
+
+async def send(client: Client, base_url: str, agent: str, prompt: str, index: int,
+               timeout: float | None, scheduled: float | None = None) -> Sample:
+    sample = Sample(index)
+    started = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout):
+            async for event in client.run_stream(prompt, agent=agent, base_url=base_url):
+                if isinstance(event, MessagePartEvent):
+                    if sample.ttfb is None:
+                        sample.ttfb = time.perf_counter() - started
+                    progress = parse_progress(event.part)
+                    if progress is not None and progress["kind"] == "timing":
+                        sample.phases = {p: progress.get(f"{p}_ms", 0.0) / 1000 for p in ("queue", "retrieval", "llm")}
+                elif isinstance(event, (RunCompletedEvent, RunFailedEvent, RunCancelledEvent)):
+                    raise_for_status(event.run)
+    except Exception as exc:
+        sample.status, sample.error = "failed", repr(exc)
+    sample.total = time.perf_counter() - started
+    return sample
+
+
+async def closed_loop(client: Client, base_url: str, agent: str, prompts: list[str], requests: int,
+                      concurrency: int, timeout: float | None) -> list[Sample]:
+    work = iter(enumerate(itertools.islice(itertools.cycle(prompts), requests)))
+    samples: list[Sample] = []
+
+    async def worker() -> None:
+        for index, prompt in work:
+            samples.append(await send(client, base_url, agent, prompt, index, timeout))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+async def open_loop(client: Client, base_url: str, agent: str, prompts: list[str], requests: int,
+                    rate: float, timeout: float | None, seed: int) -> list[Sample]:
+    rng = random.Random(seed)
+    tasks = []
+    next_at = time.perf_counter()
+    for index, prompt in enumerate(itertools.islice(itertools.cycle(prompts), requests)):
+        next_at += rng.expovariate(rate)
+        await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(send(client, base_url, agent, prompt, index, timeout, scheduled=next_at)))
+    return list(await asyncio.gather(*tasks))
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples: list[Sample], wall: float) -> dict:
+    ok = [s for s in samples if s.status == "completed"]
+    series: dict[str, list[float]] = {m: [] for m in METRICS}
+    for s in ok:
+        series["total"].append(s.total)
+        if s.ttfb is not None:
+            series["ttfb"].append(s.ttfb)
+        if s.phases:
+            for phase, seconds in s.phases.items():
+                series[phase].append(seconds)
+            series["other"].append(max(s.total - sum(s.phases.values()), 0.0))
+    latency = {
+        metric: {
+            "p50": round(percentile(values, 50) * 1000, 1),
+            "p95": round(percentile(values, 95) * 1000, 1),
+            "p99": round(percentile(values, 99) * 1000, 1),
+            "mean": round(sum(values) / len(values) * 1000, 1),
+            "max": round(max(values) * 1000, 1),
+        }
+        for metric, values in series.items() if values
+    }
+    errors: dict[str, int] = {}
+    for s in samples:
+        if s.error:
+            errors[s.error[:120]] = errors.get(s.error[:120], 0) + 1
+    return {
+        "requests": len(samples),
+        "completed": len(ok),
+        "failed": len(samples) - len(ok),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0.0,
+        "latency_ms": latency,
+        "errors": errors,
+    }
+
+
+def print_summary(name: str, summary: dict, previous: dict | None) -> None:
+    print(f"\n{name}: {summary['completed']}/{summary['requests']} completed in {summary['wall_s']}s "
+          f"-> {summary['throughput_rps']} runs/s")
+    print(f"{'ms':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}{'max':>10}")
+    for metric, stats in summary["latency_ms"].items():
+        print(f"{metric:<10}" + "".join(f"{stats[k]:>10.1f}" for k in ("p50", "p95", "p99", "mean", "max")))
+    for error, count in summary["errors"].items():
+        print(f"  {count}x {error}")
+    if previous:
+        before, after = previous["summary"], summary
+        print(f"vs {previous['timestamp']} ({previous.get('commit') or '?'}): "
+              f"throughput {before['throughput_rps']} -> {after['throughput_rps']} runs/s", end="")
+        for q in ("p50", "p95"):
+            old = before["latency_ms"].get("total", {}).get(q)
+            new = after["latency_ms"].get("total", {}).get(q)
+            if old and new:
+                print(f", total {q} {old} -> {new} ms ({(new - old) / old:+.1%})", end="")
+        print()
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(path: str, label: str, target: str, mode: dict) -> dict | None:
+    last = None
+    try:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                row = json.loads(line)
+                if row.get("label") == label and row.get("target") == target and row.get("mode") == mode:
+                    last = row
+    except FileNotFoundError:
+        pass
+    return last
+
+
+async def bench(args: argparse.Namespace) -> None:
+    prompts = load_corpus(args.corpus)
+    requests = args.requests or (math.ceil(args.rate * args.duration) if args.rate and args.duration
+                                 else len(prompts))
+    async with pooled_client(max_connections=max(args.concurrency, 20)) as client:
+        for target in args.targets:
+            base_url, agent = TARGETS.get(target, (target, args.agent))
+            if agent is None:
+                raise SystemExit(f"--agent is required for target {target}")
+            if args.warmup:
+                await closed_loop(client, base_url, agent, prompts, args.warmup, 1, args.timeout)
+
+            started = time.perf_counter()
+            if args.rate:
+                samples = await open_loop(client, base_url, agent, prompts, requests, args.rate,
+                                          args.timeout, args.seed)
+            else:
+                samples = await closed_loop(client, base_url, agent, prompts, requests,
+                                            args.concurrency, args.timeout)
+            summary = summarize(samples, time.perf_counter() - started)
+
+            mode = {"rate": args.rate} if args.rate else {"concurrency": args.concurrency}
+            previous = previous_result(args.out, args.label, target, mode)
+            print_summary(f"{target} ({agent} @ {base_url})", summary, previous)
+            record = {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "label": args.label,
+                "target": target,
+                "agent": agent,
+                "corpus": args.corpus,
+                "mode": mode,
+                "summary": summary,
+            }
+            with open(args.out, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ACP agent servers.")
+    parser.add_argument("targets", nargs="+", help="'hospital', 'insurer' or a server base URL (with --agent)")
+    parser.add_argument("--agent", help="agent name when the target is a URL")
+    parser.add_argument("--corpus", default="requests.jsonl", help=".jsonl or plain-text prompt file")
+    parser.add_argument("--requests", type=int, help="runs per target (default: corpus size)")
+    parser.add_argument("--concurrency", type=int, default=4, help="closed loop: runs in flight")
+    parser.add_argument("--rate", type=float, help="open loop: Poisson arrivals per second")
+    parser.add_argument("--duration", type=float, help="open loop: seconds of arrivals (sets --requests)")
+    parser.add_argument("--warmup", type=int, default=0, help="unmeasured runs before each target")
+    parser.add_argument("--timeout", type=float, default=300, help="per-run timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="default", help="name of this configuration, for comparisons")
+    parser.add_argument("--out", default="bench_results.jsonl", help="results file to append to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,77 @@
 import asyncio
-from acp_sdk.client import Client
-from colorama import Fore
+from colorama import Fore, Style
+from workflow import Node, NodeResult, Workflow, pooled_client
 
-async def run_hospital_workflow() -> None:
-    # Get the specific question part from user
-    health_question = input("Enter your specific health question (e.g., 'Do I need rehabilitation after...'): ")
+HOSPITAL_URL = "http://localhost:8000"
+INSURER_URL = "http://localhost:8001"
+STOCK_INFO_URL = "http://localhost:8002"
+
+COLOURS = {
+    "hospital": Fore.LIGHTMAGENTA_EX,
+    "insurer": Fore.YELLOW,
+    "stock_info": Fore.LIGHTCYAN_EX,
+}
 
-    async with Client(base_url="http://localhost:8000") as hospital, Client(base_url="http://localhost:8001") as insurer, Client(base_url="http://localhost:8002") as stock_info:
-        run1 = await hospital.run_sync(
+
+def build_workflow(health_question: str) -> Workflow:
+    # insurer needs the hospital's answer; stock_info only needs the question, so it runs alongside them.
+    return Workflow([
+        Node(
+            name="hospital",
             agent="health_agent",
+            base_url=HOSPITAL_URL,
             input=f"{health_question}. Do not tell me to consult with medical professionals for personalized "
                   "advice. Give specific advice that will not be taken as fact, and will be verified. "
-                  "Always mention that this is general advice, and to consult a doctor at the end."
-        )
-        print(run1)
-        content = run1.output[0].parts[0].content
-        print(Fore.LIGHTMAGENTA_EX + content + Fore.RESET)
-
-        run2 = await insurer.run_sync(
-            agent="policy_agent", input=f"Context: {content} What is the waiting period for rehabilitation?"
-        )
-        if not run2 == []:
-            print(Fore.YELLOW + run2.output[0].parts[0].content + Fore.RESET)
-
-        run3 = await stock_info.run_sync(
+                  "Always mention that this is general advice, and to consult a doctor at the end.",
+            timeout=180,
+            retries=1,
+            stream=True,
+        ),
+        Node(
+            name="insurer",
+            agent="policy_agent",
+            base_url=INSURER_URL,
+            input=lambda up: f"Context: {up['hospital']} What is the waiting period for rehabilitation?",
+            deps=("hospital",),
+            timeout=180,
+            retries=1,
+            stream=True,
+        ),
+        Node(
+            name="stock_info",
             agent="mcp_agent",
+            base_url=STOCK_INFO_URL,
             input=f"Context: {health_question}. What is the stock info for insurance companies regarding this health query?"
-                  f"If you can't generate an answer, default to the current (today's) AAPL stock price ."
-        )
-        if not run3 == []:
-            print(Fore.LIGHTCYAN_EX + run3.output[0].parts[0].content + Fore.RESET)
+                  f"If you can't generate an answer, default to the current (today's) AAPL stock price .",
+            timeout=120,
+            retries=2,
+        ),
+    ])
+
+
+def print_result(result: NodeResult) -> None:
+    if result.status == "completed":
+        if result.output:
+            print(COLOURS[result.name] + result.output + Fore.RESET)
+    else:
+        print(Fore.RED + f"{result.name} {result.status}: {result.error!r}" + Fore.RESET)
+
+
+def print_progress(node: str, progress: dict) -> None:
+    colour = COLOURS[node] + Style.DIM
+    if progress["kind"] == "delta":
+        print(colour + progress["content"] + Style.RESET_ALL, end="", flush=True)
+    else:
+        details = {k: v for k, v in progress.items() if k != "kind" and v}
+        print(colour + f"\n[{node}] {progress['kind']}: {details}" + Style.RESET_ALL)
+
+
+async def run_hospital_workflow() -> None:
+    # Get the specific question part from user
+    health_question = input("Enter your specific health question (e.g., 'Do I need rehabilitation after...'): ")
+
+    async with pooled_client() as client:
+        await build_workflow(health_question).run(client, on_result=print_result, on_progress=print_progress)
 
 
 if __name__ == "__main__":
@@ -3,17 +3,95 @@ from collections.abc import AsyncGenerator
 from acp_sdk.models import Message, MessagePart
 from acp_sdk.server import Context, RunYield, RunYieldResume, Server
 from smolagents import CodeAgent, DuckDuckGoSearchTool, VisitWebpageTool, LiteLLMModel
+from smolagents.memory import ActionStep, FinalAnswerStep, PlanningStep
+from smolagents.models import ChatMessageStreamDelta
+from agentpool import AgentPool
+from streaming import DeltaBuffer, clip, progress_part
+from acpmetrics import mount_metrics
+from telemetry import llm_span, note_retry, note_tokens, otlp_enabled, registry, tool_span, track_run
+from timings import start_run, timed
 
 
 API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_KEY_HERE")
 
-model = LiteLLMModel(
-    model_id="gemini/gemini-1.5-flash",   # or gemini-1.5-pro-latest
+
+class TimedLiteLLMModel(LiteLLMModel):
+    """LiteLLMModel that traces each request, counts its tokens and adds its time to the run's "llm" phase."""
+
+    def generate(self, *args, **kwargs):
+        with timed("llm"), llm_span(self.model_id) as span:
+            message = super().generate(*args, **kwargs)
+            record_usage(span, message.token_usage)
+            return message
+
+    def generate_stream(self, *args, **kwargs):
+        with timed("llm"), llm_span(self.model_id, **{"llm.stream": True}) as span:
+            for delta in super().generate_stream(*args, **kwargs):
+                record_usage(span, delta.token_usage)
+                yield delta
+
+
+def record_usage(span, usage) -> None:
+    if usage is not None:
+        span.set_attribute("llm.tokens.prompt", usage.input_tokens)
+        span.set_attribute("llm.tokens.completion", usage.output_tokens)
+        note_tokens(usage.input_tokens, usage.output_tokens)
+
+
+# LLM_MODEL / LLM_API_BASE point the agent at another LiteLLM backend, e.g. mockllm.py for benchmarks.
+model = TimedLiteLLMModel(
+    model_id=os.getenv("LLM_MODEL", "gemini/gemini-1.5-flash"),   # or gemini-1.5-pro-latest
+    api_base=os.getenv("LLM_API_BASE"),
     api_key=API_KEY,
     num_ctx=8192,  # ~32k
 )
 
+
+def timed_tool(tool):
+    # Web lookups are this agent's retrieval step.
+    forward = tool.forward
+
+    def run(*args, **kwargs):
+        with timed("retrieval"), tool_span(tool.name):
+            return forward(*args, **kwargs)
+
+    tool.forward = run
+    return tool
+
+
+def build_agent() -> CodeAgent:
+    # Each pooled worker gets its own agent and tool instances; they are reused across runs.
+    return CodeAgent(
+        tools=[timed_tool(DuckDuckGoSearchTool()), timed_tool(VisitWebpageTool())],
+        model=model,
+        stream_outputs=True,
+    )
+
+
+# Sized by HEALTH_POOL_WORKERS / HEALTH_POOL_QUEUE_DEPTH / HEALTH_POOL_TIMEOUT.
+pool = AgentPool.from_env(build_agent, "HEALTH_POOL")
+registry.register_stats("agent_pool", pool.stats, labels={"pool": pool.name},
+                        counters=("completed", "failed", "timeouts", "rejected"))
+
 server = Server()
+mount_metrics(server)
+
+
+def step_progress(step) -> MessagePart | None:
+    """Translate one smolagents stream item into an ACP progress part."""
+    if isinstance(step, ChatMessageStreamDelta):
+        return progress_part("delta", content=step.content) if step.content else None
+    if isinstance(step, PlanningStep):
+        return progress_part("plan", plan=clip(step.plan))
+    if isinstance(step, ActionStep):
+        return progress_part(
+            "step",
+            step=step.step_number,
+            tool_calls=[{"tool": c.name, "arguments": clip(c.arguments)} for c in step.tool_calls or []],
+            observations=clip(step.observations or ""),
+            error=str(step.error) if step.error else None,
+        )
+    return None
 
 
 @server.agent()
@@ -23,16 +101,26 @@ async def health_agent(
 ) -> AsyncGenerator[RunYield, RunYieldResume]:
     """Handles health-related questions from patients using web tools + Gemini."""
 
-    agent = CodeAgent(
-        tools=[DuckDuckGoSearchTool(), VisitWebpageTool()],
-        model=model
-    )
-
     prompt: str = input[0].parts[0].content
-    response = agent.run(prompt)
+    timings = start_run()
+    response = None
+    deltas = DeltaBuffer()
+    with track_run("health_agent"):
+        async for step in pool.stream(prompt):
+            if isinstance(step, FinalAnswerStep):
+                response = step.output
+                continue
+            if isinstance(step, ActionStep) and step.error:
+                # The agent retries on its next step; count it against this run.
+                note_retry("step", step.error)
+            for part in deltas.push(step_progress(step)):
+                yield part
+        for part in deltas.flush():
+            yield part
 
-    yield Message(parts=[MessagePart(content=str(response))])
+        yield timings.part()
+        yield Message(parts=[MessagePart(content=str(response))])
 
 
 if __name__ == "__main__":
-    server.run(port=8000)
+    server.run(port=8000, configure_telemetry=otlp_enabled())
@@ -0,0 +1,374 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+import chromadb
+import ollama
+from pypdf import PdfReader
+
+from ragindex import APP_ID, DB_DIR, Manifest, collection_name, embedder_id, file_digest, source_key
+
+# Bulk loader for the policy RAG store.
+#
+#   python ingest.py data/ more-policies/ --workers 8 --batch-size 64 --concurrency 4
+#
+# Page ranges are extracted and chunked in a process pool, chunks are embedded
+# in batches through Ollama's /api/embed with bounded concurrency, and each
+# batch is upserted straight into the same Chroma collection RagTool reads.
+# This is the only writer of that collection: the servers call
+# ensure_indexed() at start-up instead of RagTool.add().
+#
+# Chunk ids and metadata follow embedchain's scheme ("<app_id>--" + sha256 of
+# text + source, with app_id / doc_id / hash metadata), so RagTool's own
+# lookups see the same chunks.  Chunks that are already stored are not
+# re-embedded, stale chunks of changed files are deleted afterwards, and every
+# finished file is recorded in the ragindex manifest so it is skipped next time.
+
+logger = logging.getLogger("ingest")
+
+CHUNK_SIZE = 1000  # same as embedchain's PdfFileChunker
+
+
+def clean_text(text: str) -> str:
+    # Mirrors embedchain's clean_string so chunks look the same either way.
+    text = re.sub(r"\s+", " ", text.strip())
+    text = text.replace("\\", "").replace("#", " ")
+    return re.sub(r"([^\w\s])\1*", r"\1", text)
+
+
+def split_text(text: str, size: int = CHUNK_SIZE) -> list[str]:
+    """Greedy word-boundary split into chunks of at most `size` characters."""
+    chunks, current = [], ""
+    for word in text.split(" "):
+        while len(word) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(word[:size])
+            word = word[size:]
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > size:
+            chunks.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def extract_pages(path: str, start: int, stop: int, chunk_size: int) -> list[tuple[int, list[str]]]:
+    """Runs in a worker process: text chunks for pages [start, stop) of one PDF."""
+    reader = PdfReader(path)
+    pages = []
+    for number in range(start, min(stop, len(reader.pages))):
+        text = clean_text(reader.pages[number].extract_text() or "")
+        pages.append((number, split_text(text, chunk_size) if text else []))
+    return pages
+
+
+def discover(paths: Iterable[str]) -> list[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+        elif path.lower().endswith(".pdf"):
+            found.append(path)
+    return sorted(set(found))
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: dict
+    job: "FileJob"
+
+
+@dataclass
+class FileJob:
+    path: str
+    source: str
+    digest: str
+    existing_ids: set[str]
+    seen_ids: set[str] = field(default_factory=set)
+    reused: dict[str, dict] = field(default_factory=dict)  # id -> metadata of chunks kept from the store
+    tasks_left: int = 0
+    chunks_left: int = 0
+    pages: int = 0
+    finished: bool = False
+    failed: bool = False
+
+
+@dataclass
+class Progress:
+    files_total: int
+    files_done: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    errors: dict[str, str] = field(default_factory=dict)  # source -> error
+    pages: int = 0
+    chunks: int = 0
+    reused: int = 0
+    embedded: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    _last_report: float = 0.0
+
+    def report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_report < 2.0:
+            return
+        self._last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        logger.info(
+            "files %d/%d (skipped %d, failed %d) | pages %d (%.1f/s) | chunks %d, reused %d | embedded %d (%.1f/s)",
+            self.files_done + self.files_skipped + self.files_failed, self.files_total, self.files_skipped,
+            self.files_failed,
+            self.pages, self.pages / elapsed, self.chunks, self.reused,
+            self.embedded, self.embedded / elapsed,
+        )
+
+
+class Ingestor:
+    def __init__(self, model: str = "all-minilm:latest", db_dir: str = DB_DIR, workers: int | None = None,
+                 pages_per_task: int = 8, batch_size: int = 64, concurrency: int = 4,
+                 chunk_size: int = CHUNK_SIZE, manifest: Manifest | None = None, host: str | None = None,
+                 collection=None):
+        embedder: dict[str, Any] = {"model": model}
+        if host:
+            embedder["base_url"] = host
+        config = {"embedding_model": {"provider": "ollama", "config": embedder}}
+        self.model = model
+        self.embedder = embedder_id(config)
+        self.collection_name = collection_name(config)
+        if collection is None:
+            collection = chromadb.PersistentClient(path=db_dir).get_or_create_collection(
+                self.collection_name, embedding_function=None
+            )
+        self.collection = collection
+        self.manifest = manifest or Manifest(os.path.join(db_dir, "rag_manifest.json"))
+        # workers=0 extracts in a thread instead of a process pool (a single document at start-up).
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pages_per_task = pages_per_task
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.client = ollama.AsyncClient(host=host)
+        self._embedders: list[asyncio.Task] = []
+
+    async def run(self, paths: Iterable[str]) -> Progress:
+        files = discover(paths)
+        progress = Progress(files_total=len(files))
+        queue: asyncio.Queue[Chunk | None] = asyncio.Queue(maxsize=self.batch_size * self.concurrency * 4)
+        self._embedders = [asyncio.create_task(self._embed_worker(queue, progress)) for _ in range(self.concurrency)]
+
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else ThreadPoolExecutor(1)
+        extractions: list[asyncio.Task] = []
+        try:
+            with executor:
+                for path in files:
+                    try:
+                        planned = await asyncio.to_thread(self._plan, path)
+                    except Exception as exc:
+                        self._fail(source_key(path), exc, progress)
+                        continue
+                    if planned is None:
+                        progress.files_skipped += 1
+                        continue
+                    job, page_count = planned
+                    job.tasks_left = len(range(0, page_count, self.pages_per_task))
+                    if job.tasks_left == 0:
+                        await self._finish(job, progress)
+                    for start in range(0, page_count, self.pages_per_task):
+                        future = loop.run_in_executor(executor, extract_pages, path, start,
+                                                      start + self.pages_per_task, self.chunk_size)
+                        extractions.append(asyncio.create_task(self._collect(job, future, queue, progress)))
+                await asyncio.gather(*extractions)
+
+            for _ in self._embedders:
+                await self._put(queue, None)
+            await asyncio.gather(*self._embedders)
+        except BaseException:
+            for task in (*extractions, *self._embedders):
+                task.cancel()
+            raise
+        progress.report(force=True)
+        return progress
+
+    async def _put(self, queue: asyncio.Queue, item: Chunk | None) -> None:
+        # A bare queue.put() on a full queue would block forever once every embedder has died.
+        put = asyncio.ensure_future(queue.put(item))
+        try:
+            while not put.done():
+                for task in self._embedders:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                running = [t for t in self._embedders if not t.done()]
+                if not running:
+                    raise RuntimeError("All embedding workers have exited")
+                await asyncio.wait([put, *running], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            put.cancel()
+
+    def _plan(self, path: str) -> tuple[FileJob, int] | None:
+        source, digest = source_key(path), file_digest(path)
+        # Trust the manifest only while the store still holds chunks of the document.
+        if (self.manifest.is_current(self.collection_name, self.embedder, source, digest)
+                and self.collection.get(where={"url": source}, limit=1, include=[])["ids"]):
+            return None
+        # Every chunk of the source, whatever app_id or id scheme wrote it, so all stale ones get deleted.
+        existing = self.collection.get(where={"url": source}, include=[])["ids"]
+        job = FileJob(path=path, source=source, digest=digest, existing_ids=set(existing))
+        return job, len(PdfReader(path).pages)
+
+    async def _collect(self, job: FileJob, future: asyncio.Future,
+                       queue: asyncio.Queue, progress: Progress) -> None:
+        try:
+            pages = await future
+        except Exception as exc:
+            # A corrupt or unreadable PDF fails on its own; the rest of the run goes on.
+            # Chunks it already queued are still stored, but without _finish() it is
+            # not recorded in the manifest, so the next run tries it again.
+            if not job.failed:
+                job.failed = True
+                self._fail(job.source, exc, progress)
+        if not job.failed:
+            await self._enqueue(job, pages, queue, progress)
+        job.tasks_left -= 1
+        if job.tasks_left == 0 and job.chunks_left == 0:
+            await self._finish(job, progress)
+        progress.report()
+
+    async def _enqueue(self, job: FileJob, pages: list[tuple[int, list[str]]],
+                       queue: asyncio.Queue, progress: Progress) -> None:
+        progress.pages += len(pages)
+        job.pages += len(pages)
+        for number, texts in pages:
+            for text in texts:
+                chunk_hash = hashlib.sha256((text + job.source).encode()).hexdigest()
+                chunk_id = f"{APP_ID}--{chunk_hash}"
+                if chunk_id in job.seen_ids:
+                    continue
+                job.seen_ids.add(chunk_id)
+                progress.chunks += 1
+                metadata = {"url": job.source, "data_type": "pdf_file", "doc_id": f"{APP_ID}--{job.digest}",
+                            "app_id": APP_ID, "hash": chunk_hash, "page": number}
+                if chunk_id in job.existing_ids:
+                    job.reused[chunk_id] = metadata
+                    progress.reused += 1
+                    continue
+                job.chunks_left += 1
+                await self._put(queue, Chunk(chunk_id, text, metadata, job))
+
+    async def _embed_worker(self, queue: asyncio.Queue, progress: Progress) -> None:
+        while True:
+            batch: list[Chunk] = []
+            item = await queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            if batch:
+                await self._flush(batch, progress)
+            if item is None:
+                return
+
+    async def _flush(self, batch: list[Chunk], progress: Progress, attempts: int = 3) -> None:
+        for attempt in range(attempts):
+            try:
+                response = await self.client.embed(model=self.model, input=[c.text for c in batch])
+                break
+            except (ollama.ResponseError, ConnectionError) as exc:
+                if attempt == attempts - 1:
+                    raise
+                logger.warning("Embedding batch failed (%s); retrying", exc)
+                await asyncio.sleep(2 ** attempt)
+        await asyncio.to_thread(
+            self.collection.upsert,
+            ids=[c.id for c in batch],
+            embeddings=response["embeddings"],
+            documents=[c.text for c in batch],
+            metadatas=[c.metadata for c in batch],
+        )
+        progress.embedded += len(batch)
+        for chunk in batch:
+            job = chunk.job
+            job.chunks_left -= 1
+            if job.tasks_left == 0 and job.chunks_left == 0:
+                await self._finish(job, progress)
+        progress.report()
+
+    @staticmethod
+    def _fail(source: str, exc: Exception, progress: Progress) -> None:
+        progress.files_failed += 1
+        progress.errors[source] = repr(exc)
+        logger.error("Could not index %s: %r", source, exc)
+
+    async def _finish(self, job: FileJob, progress: Progress) -> None:
+        if job.finished or job.failed:
+            return
+        job.finished = True
+        stale = list(job.existing_ids - job.seen_ids)
+        if stale:
+            await asyncio.to_thread(self.collection.delete, ids=stale)
+        if job.reused:
+            # Kept vectors move to the new doc_id (and page, if the text moved).
+            await asyncio.to_thread(self.collection.update, ids=list(job.reused),
+                                    metadatas=list(job.reused.values()))
+        await asyncio.to_thread(self.manifest.record, self.collection_name, self.embedder, job.source,
+                                job.digest, data_type="pdf_file", chunks=len(job.seen_ids), pages=job.pages)
+        progress.files_done += 1
+        logger.info("Indexed %s: %d pages, %d chunks (%d stale removed)",
+                    job.source, job.pages, len(job.seen_ids), len(stale))
+
+
+def ensure_indexed(collection, path: str, config: dict[str, Any], manifest: Manifest | None = None) -> None:
+    """Bring `path` up to date in RagTool's `collection`, embedding only chunks it does not hold yet."""
+    embedder = config["embedding_model"]["config"]
+    ingestor = Ingestor(model=embedder["model"], host=embedder.get("base_url"), workers=0,
+                        manifest=manifest, collection=collection)
+    started = time.perf_counter()
+    progress = asyncio.run(ingestor.run([path]))
+    if progress.files_failed:
+        raise RuntimeError(f"Could not index {source_key(path)}: {progress.errors[source_key(path)]}")
+    if progress.files_skipped:
+        logger.info("RAG index for %s is current (%s); skipping embed", source_key(path), ingestor.embedder)
+    else:
+        logger.info("Indexed %s into %s in %.1fs (%d chunks embedded, %d reused)", source_key(path),
+                    ingestor.collection_name, time.perf_counter() - started, progress.embedded, progress.reused)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-ingest policy PDFs into the RAG store.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories to scan for *.pdf")
+    parser.add_argument("--model", default="all-minilm:latest", help="Ollama embedding model")
+    parser.add_argument("--host", default=os.getenv("OLLAMA_HOST"), help="Ollama server (default: OLLAMA_HOST)")
+    parser.add_argument("--db", default=DB_DIR, help="Chroma persistence directory")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="embedding requests in flight")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    ingestor = Ingestor(model=args.model, db_dir=args.db, workers=args.workers,
+                        pages_per_task=args.pages_per_task, batch_size=args.batch_size,
+                        concurrency=args.concurrency, host=args.host)
+    progress = asyncio.run(ingestor.run(args.paths))
+    if progress.files_failed:
+        raise SystemExit(f"{progress.files_failed} file(s) could not be indexed: {', '.join(progress.errors)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,23 @@
 import os
+import asyncio
+import ollama
 from crewai import Crew, Task, Agent, LLM
+from crewai.agents.parser import AgentAction
+from crewai.utilities.events import LLMCallFailedEvent, LLMStreamChunkEvent, ToolUsageErrorEvent, crewai_event_bus
 from crewai_tools import RagTool
-from collections.abc import AsyncGenerator
+from ingest import ensure_indexed
+from ragindex import with_vectordb
+from retrieval import HybridRetriever, PolicySearchTool
+from answercache import AnswerCache
+from streaming import DeltaBuffer, ProgressChannel, clip, progress_part
+from acpmetrics import mount_metrics
+from telemetry import llm_span, note_retry, note_tokens, otlp_enabled, registry, tracer, track_run
+from timings import start_run, timed
+from collections.abc import AsyncGenerator, Callable
 from acp_sdk.models import Message, MessagePart
 from acp_sdk.server import Context, RunYield, RunYieldResume, Server
 import logging
+from opentelemetry import trace
 
 # ── 0.  Make sure your Gemini API key is available ────────────────────────────
 # PowerShell (one-off):  $env:GEMINI_API_KEY="your-key"
@@ -12,11 +25,38 @@ import logging
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-llm = LLM(
-    model="gemini/gemini-1.5-flash",
-    api_key=API_KEY,
-    max_tokens=8192,
-)
+
+class TimedLLM(LLM):
+    """LLM that traces each request and adds its time to the current run's "llm" phase."""
+
+    def call(self, *args, **kwargs):
+        with timed("llm"), llm_span(self.model):
+            return super().call(*args, **kwargs)
+
+    def _handle_streaming_callbacks(self, callbacks, usage_info, last_chunk) -> None:
+        # Where crewai hands over a streamed response's LiteLLM usage; still inside call()'s span.
+        # Run totals come from crew.usage_metrics, so this only annotates the span.
+        usage = usage_info or getattr(last_chunk, "usage", None)
+        if usage:
+            span = trace.get_current_span()
+            for kind in ("prompt", "completion"):
+                key = f"{kind}_tokens"
+                count = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+                span.set_attribute(f"llm.tokens.{kind}", count or 0)
+        super()._handle_streaming_callbacks(callbacks, usage_info, last_chunk)
+
+
+def build_llm() -> LLM:
+    # A fresh LLM per run so its stream-chunk events can be routed back to that run.
+    # LLM_MODEL / LLM_API_BASE point it at another LiteLLM backend, e.g. mockllm.py for benchmarks.
+    return TimedLLM(
+        model=os.getenv("LLM_MODEL", "gemini/gemini-1.5-flash"),
+        base_url=os.getenv("LLM_API_BASE"),
+        api_key=API_KEY,
+        max_tokens=8192,
+        stream=True,
+    )
+
 
 config = {
     "llm": {
@@ -30,60 +70,166 @@ config = {
         "provider": "ollama",
         "config": {
             "model": "all-minilm:latest",
+            "base_url": os.getenv("OLLAMA_HOST", "http://localhost:11434"),
         },
     },
 }
 
-rag_tool = RagTool(config=config)
-rag_tool.add("./data/gold-hospital-and-premium-extras.pdf", data_type="pdf_file")
+POLICY_PDF = "./data/gold-hospital-and-premium-extras.pdf"
 
-# ── 3.  Insurance agent definition -------------------------------------------
-insurance_agent = Agent(
-    role="Senior Insurance Coverage Assistant",
-    goal="Determine whether something is covered or not",
-    backstory=(
-        "You are an expert insurance agent designed to assist with coverage queries. "
-        "Whenever you call the knowledge-base tool the input must follow the pattern "
-        "{query:'your query', kwargs:{}}"
-    ),
-    verbose=True,
-    allow_delegation=False,
-    llm=llm,
-    tools=[rag_tool],
-    max_retry_limit=5,
+rag_tool = RagTool(config=with_vectordb(config))
+ensure_indexed(rag_tool.adapter.embedchain_app.db.collection, POLICY_PDF, config)
+
+# RagTool owns the Chroma collection and its embedder; the agent searches it through the
+# hybrid BM25 + vector retriever, which returns a small, token-budgeted context.
+retriever = HybridRetriever(
+    rag_tool.adapter.embedchain_app.db.collection,
+    token_budget=int(os.getenv("POLICY_CONTEXT_TOKENS", "1200")),
 )
+policy_index = retriever.refresh()
+policy_search = PolicySearchTool(retriever=retriever)
+
+# ── 3.  Insurance agent definition -------------------------------------------
+def build_insurance_agent(llm: LLM) -> Agent:
+    return Agent(
+        role="Senior Insurance Coverage Assistant",
+        goal="Determine whether something is covered or not",
+        backstory=(
+            "You are an expert insurance agent designed to assist with coverage queries. "
+            "Look things up in the policy with the policy_search tool and base your answer "
+            "on the excerpts it returns."
+        ),
+        verbose=True,
+        allow_delegation=False,
+        llm=llm,
+        tools=[policy_search],
+        max_retry_limit=5,
+    )
+
+
+# LLM token deltas arrive on CrewAI's global event bus; route them to the run that owns the LLM.
+_token_sinks: dict[int, Callable[[str], None]] = {}
+
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def _forward_chunk(source, event: LLMStreamChunkEvent) -> None:
+    sink = _token_sinks.get(id(source))
+    if sink is not None and event.chunk:
+        sink(event.chunk)
+
+
+# Tool errors and failed LLM calls make the agent try again; count them against the run.
+@crewai_event_bus.on(ToolUsageErrorEvent)
+def _tool_retry(source, event: ToolUsageErrorEvent) -> None:
+    note_retry("tool", event.error)
+
+
+@crewai_event_bus.on(LLMCallFailedEvent)
+def _llm_retry(source, event: LLMCallFailedEvent) -> None:
+    note_retry("llm", event.error)
+
 
 logger = logging.getLogger(__name__)
+
+
+# ── 4.  Answer cache ----------------------------------------------------------
+def embed_question(text: str) -> list[float]:
+    model = config["embedding_model"]["config"]["model"]
+    with tracer.start_as_current_span("embed question", attributes={"embedding.model": model}):
+        return ollama.embed(model=model, input=text)["embeddings"][0]
+
+
+# Entries are tied to the fingerprint of the indexed chunks: when the collection changes
+# (a re-indexed or newly ingested document), the cache starts cold.
+answer_cache = AnswerCache(
+    embed=embed_question,
+    max_entries=int(os.getenv("POLICY_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("POLICY_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("POLICY_CACHE_SIMILARITY", "0.92")),
+    version=policy_index.fingerprint,
+)
+registry.register_stats("policy_cache", answer_cache.stats,
+                        counters=("hits", "semantic_hits", "misses", "coalesced", "evictions"))
+
 server = Server()
+mount_metrics(server)
 
-# ── 4.  ACP agent -------------------------------------------------------------
-@server.agent()
-async def policy_agent(
-    input: list[Message],
-    context: Context,
-) -> AsyncGenerator[RunYield, RunYieldResume]:
-    """Answer insurance-policy questions with RAG + Gemini."""
+
+async def run_crew(question: str, emit: Callable[[object], None]) -> str:
+    llm = build_llm()
+    insurance_agent = build_insurance_agent(llm)
+
+    def on_step(step) -> None:
+        if isinstance(step, AgentAction):
+            emit(progress_part("tool_call", tool=step.tool, input=clip(step.tool_input), thought=clip(step.thought)))
+            if step.tool == policy_search.name:
+                emit(progress_part("snippet", content=clip(step.result, 2000)))
 
     task = Task(
-        description=input[0].parts[0].content,
+        description=question,
         expected_output=(
             "A comprehensive answer to the user's question, containing the word "
             "'THE-FLASH!' at least twice."
         ),
         agent=insurance_agent,
     )
-    crew = Crew(agents=[insurance_agent], tasks=[task], verbose=True)
+    crew = Crew(agents=[insurance_agent], tasks=[task], verbose=True, step_callback=on_step)
 
-    task_output = await crew.kickoff_async()
+    _token_sinks[id(llm)] = lambda chunk: emit(progress_part("delta", content=chunk))
+    try:
+        task_output = await crew.kickoff_async()
+    finally:
+        del _token_sinks[id(llm)]
+        usage = crew.usage_metrics
+        if usage is not None:
+            note_tokens(usage.prompt_tokens, usage.completion_tokens)
     logger.info("Task completed successfully")
     logger.info(task_output)
+    return str(task_output)
 
-    # ACP ≥ 0.12: yield the Message itself (no RunYield(...))
-    yield Message(
-        role="agent/policy_agent",
-        parts=[MessagePart(content=str(task_output), content_type="text/plain")],
-    )
+
+# ── 5.  ACP agent -------------------------------------------------------------
+@server.agent()
+async def policy_agent(
+    input: list[Message],
+    context: Context,
+) -> AsyncGenerator[RunYield, RunYieldResume]:
+    """Answer insurance-policy questions with RAG + Gemini."""
+
+    question: str = input[0].parts[0].content
+    timings = start_run()
+
+    with track_run("policy_agent"):
+        index = await asyncio.to_thread(retriever.refresh)
+        answer_cache.set_version(index.fingerprint)
+
+        # Progress from the crew (running in a worker thread) is streamed while the answer is computed.
+        # Cache hits and coalesced requests simply get no progress parts.
+        channel = ProgressChannel()
+        answer_task = asyncio.create_task(
+            answer_cache.get_or_compute(question, lambda: run_crew(question, channel.put))
+        )
+        answer_task.add_done_callback(lambda _: channel.close())
+        deltas = DeltaBuffer()
+        try:
+            async for part in channel:
+                for out in deltas.push(part):
+                    yield out
+            for out in deltas.flush():
+                yield out
+        finally:
+            # If the client goes away the run keeps going for the cache and other waiters.
+            answer_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        answer = await answer_task
+        logger.info("Answer cache: %s", answer_cache.stats())
+        yield timings.part()
+
+        # ACP ≥ 0.12: yield the Message itself (no RunYield(...))
+        yield Message(
+            role="agent/policy_agent",
+            parts=[MessagePart(content=answer, content_type="text/plain")],
+        )
 
 
 if __name__ == "__main__":
-    server.run(port=8001)
+    server.run(port=8001, configure_telemetry=otlp_enabled())
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Deterministic, offline stand-in for the model backends, for benchmarks.
+#
+#   python mockllm.py --port 9000
+#   LLM_MODEL=openai/mock LLM_API_BASE=http://localhost:9000/v1 GEMINI_API_KEY=mock \
+#   OLLAMA_HOST=http://localhost:9000 POLICY_CACHE_SIZE=0 python insuranceacpserver.py
+#
+# The mock's embeddings go to their own Chroma collection (ragindex.embedder_id
+# includes a non-default OLLAMA_HOST), so they never mix with real vectors.
+# POLICY_CACHE_SIZE=0 turns the answer cache off; leave it on only to measure it.
+#
+# /v1/chat/completions speaks the OpenAI API that LiteLLM uses (incl. SSE
+# streaming) and recognises who is asking:
+#   - smolagents' CodeAgent gets a code blob that calls final_answer(...)
+#   - a CrewAI agent first calls its first tool with the task as the query,
+#     then gives a "Final Answer:" once it has seen an Observation
+# /api/embed and /api/embeddings answer like Ollama with hashed bag-of-words
+# vectors, so texts that share words are close and the same text always
+# gets the same vector.
+#
+# Latency follows MOCK_LATENCY_MS (time to first token) + output tokens at
+# MOCK_TOKENS_PER_S; answers are MOCK_ANSWER_WORDS words long.
+
+LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "300"))
+TOKENS_PER_S = float(os.getenv("MOCK_TOKENS_PER_S", "150"))
+ANSWER_WORDS = int(os.getenv("MOCK_ANSWER_WORDS", "80"))
+EMBED_DIM = int(os.getenv("MOCK_EMBED_DIM", "384"))  # all-minilm
+EMBED_LATENCY_MS = float(os.getenv("MOCK_EMBED_LATENCY_MS", "5"))
+
+VOCAB = (
+    "cover policy benefit waiting period months rehabilitation hospital extras claim limit excess "
+    "member provider treatment admission program physiotherapy recovery general advice doctor "
+    "consult specific includes applies after before each year eligible services annual"
+).split()
+
+app = FastAPI(title="mock-llm")
+
+
+def _seed(text: str) -> bytes:
+    return hashlib.sha256(text.encode()).digest()
+
+
+def answer_text(question: str, words: int = ANSWER_WORDS) -> str:
+    digest = _seed(question)
+    picked = [VOCAB[(digest[i % len(digest)] + i) % len(VOCAB)] for i in range(words)]
+    return "General advice: " + " ".join(picked) + ". THE-FLASH! THE-FLASH! Consult a doctor."
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _text(content) -> str:
+    if isinstance(content, list):  # OpenAI content parts
+        return "".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return content or ""
+
+
+def reply_for(messages: list[dict]) -> str:
+    system = "\n".join(_text(m["content"]) for m in messages if m["role"] == "system")
+    prompt = "\n".join(_text(m["content"]) for m in messages)
+    users = [_text(m["content"]) for m in messages if m["role"] == "user"]
+    question = users[0] if users else prompt
+
+    if "final_answer" in system and "<end_code>" in system:
+        task = re.search(r"New task:\s*(.*)", question, re.DOTALL)
+        answer = answer_text((task.group(1) if task else question).strip())
+        return f"Thought: I can answer this directly.\nCode:\n```py\nfinal_answer({json.dumps(answer)})\n```<end_code>"
+
+    if "Final Answer:" in prompt:
+        task = re.search(r"Current Task:\s*(.*?)\n", prompt)
+        question = task.group(1) if task else question
+        tool = re.search(r"Tool Name:\s*(\S+)", prompt)
+        if tool and "\nObservation:" not in prompt:
+            return (f"Thought: I should search the policy.\nAction: {tool.group(1)}\n"
+                    f"Action Input: {json.dumps({'query': question})}")
+        return f"Thought: I now know the final answer\nFinal Answer: {answer_text(question)}"
+
+    return answer_text(question)
+
+
+def apply_stop(text: str, stop) -> str:
+    for s in [stop] if isinstance(stop, str) else stop or []:
+        if s and s in text:
+            text = text[:text.index(s)]
+    return text
+
+
+def usage(messages: list[dict], text: str) -> dict:
+    prompt_tokens = sum(estimate_tokens(_text(m["content"])) for m in messages)
+    completion_tokens = estimate_tokens(text)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages, model = body.get("messages", []), body.get("model", "mock")
+    text = apply_stop(reply_for(messages), body.get("stop"))
+    created, ident = int(time.time()), "chatcmpl-" + _seed(text).hex()[:24]
+
+    await asyncio.sleep(LATENCY_MS / 1000)
+    if not body.get("stream"):
+        await asyncio.sleep(estimate_tokens(text) / TOKENS_PER_S)
+        return JSONResponse({
+            "id": ident, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(messages, text),
+        })
+
+    def chunk(delta: dict, finish: str | None = None, **extra) -> str:
+        data = {"id": ident, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*|\s+", text):
+            await asyncio.sleep(estimate_tokens(piece) / TOKENS_PER_S)
+            yield chunk({"content": piece})
+        yield chunk({}, "stop", usage=usage(messages, text))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def embed(text: str) -> list[float]:
+    vector = [0.0] * EMBED_DIM
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        h = _seed(word)
+        vector[int.from_bytes(h[:4], "big") % EMBED_DIM] += 1.0 if h[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@app.post("/api/embed")
+async def ollama_embed(request: Request):
+    body = await request.json()
+    inputs = body.get("input", "")
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    await asyncio.sleep(EMBED_LATENCY_MS / 1000)
+    return {"model": body.get("model"), "embeddings": [embed(t) for t in inputs]}
+
+
+@app.post("/api/embeddings")
+async def ollama_embeddings(request: Request):
+    body = await request.json()
+    await asyncio.sleep(EMBED_LATENCY_MS / 1000)
+    return {"embedding": embed(body.get("prompt", ""))}
+
+
+@app.get("/api/tags")
+async def ollama_tags():
+    return {"models": [{"name": "all-minilm:latest", "model": "all-minilm:latest", "size": 0}]}
+
+
+@app.post("/api/pull")
+async def ollama_pull():
+    return {"status": "success"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic mock of the LLM and Ollama endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import copy
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any
+
+# Content-addressed bookkeeping for the Chroma store under db/.
+#
+# Every (document, embedding model) pair that has been embedded is recorded in
+# db/rag_manifest.json together with the sha256 of the file.  On start-up
+# ingest.ensure_indexed() hashes the file and skips it when the hash and the
+# embedder match and the collection still holds its chunks, so replicas reuse
+# the persisted HNSW segment instead of re-parsing and re-embedding the PDF.
+# When a document *does* change, only chunks whose ids are not stored yet are
+# embedded and chunks that disappeared are deleted.
+
+DB_DIR = "db"
+DEFAULT_BASE_URLS = ("http://localhost:11434", "http://127.0.0.1:11434")
+APP_ID = "default-app-id"  # embedchain's default app id, which RagTool's App filters its chunks on
+MANIFEST_PATH = os.path.join(DB_DIR, "rag_manifest.json")
+
+logger = logging.getLogger(__name__)
+
+
+def embedder_id(config: dict[str, Any]) -> str:
+    """Stable id of the embedding model configured for RagTool, e.g. 'ollama:all-minilm:latest'.
+
+    A non-default server is part of the id ('ollama:all-minilm:latest@http://localhost:9000'): the
+    same model name elsewhere (e.g. mockllm.py) may produce different vectors.
+    """
+    section = config.get("embedding_model") or config.get("embedder") or {}
+    provider = section.get("provider", "openai")
+    model = section.get("config", {}).get("model", "default")
+    base_url = (section.get("config", {}).get("base_url") or "").rstrip("/")
+    if base_url and base_url not in DEFAULT_BASE_URLS:
+        return f"{provider}:{model}@{base_url}"
+    return f"{provider}:{model}"
+
+
+def collection_name(config: dict[str, Any]) -> str:
+    """Chroma collection for this embedder. Vectors from different models never share a collection."""
+    ident = embedder_id(config)
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", ident).strip("-")[:40]
+    digest = hashlib.sha256(ident.encode()).hexdigest()[:8]
+    return f"policy-{slug}-{digest}"
+
+
+def with_vectordb(config: dict[str, Any], db_dir: str = DB_DIR) -> dict[str, Any]:
+    """Copy of a RagTool config pinned to the persistent, per-embedder Chroma collection."""
+    config = copy.deepcopy(config)
+    config["vectordb"] = {
+        "provider": "chroma",
+        "config": {"collection_name": collection_name(config), "dir": db_dir},
+    }
+    return config
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """JSON record of what has already been embedded into each collection."""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+
+    def load(self) -> dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"collections": {}}
+        except json.JSONDecodeError:
+            logger.warning("Ignoring unreadable RAG manifest at %s", self.path)
+            return {"collections": {}}
+
+    def is_current(self, collection: str, embedder: str, source: str, digest: str) -> bool:
+        data = self.load()["collections"].get(collection)
+        if not data or data.get("embedder") != embedder:
+            return False
+        entry = data.get("sources", {}).get(source)
+        return entry is not None and entry.get("sha256") == digest
+
+    def record(self, collection: str, embedder: str, source: str, digest: str, **extra: Any) -> None:
+        # Hold an exclusive lock across read-modify-replace so concurrent replicas
+        # don't drop each other's entries; readers never see a partial file either way.
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.load()
+            coll = data["collections"].setdefault(collection, {"embedder": embedder, "sources": {}})
+            coll["embedder"] = embedder
+            coll["sources"][source] = {"sha256": digest, "indexed_at": time.time(), **extra}
+            self._write(directory, data)
+
+    def _write(self, directory: str, data: dict[str, Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".rag_manifest.")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def source_key(path: str) -> str:
+    return os.path.normpath(path).replace(os.sep, "/")
@@ -0,0 +1,285 @@
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any
+
+from crewai.tools import BaseTool
+from opentelemetry import trace
+from pydantic import BaseModel, Field
+
+from ragindex import DB_DIR, MANIFEST_PATH
+from telemetry import tool_span, tracer
+from timings import timed
+
+# Hybrid retrieval over the policy collection.
+#
+# A BM25 index over the same chunks that live in Chroma catches exact policy
+# wording ("waiting period", "rehabilitation") that small embedding models
+# blur, while the vector search catches paraphrases.  Both rankings are fused
+# with reciprocal-rank fusion, the top candidates are reranked on query-term
+# coverage and phrase matches, and the best chunks are packed into a fixed
+# token budget so the agent gets one short, relevant context per tool call.
+#
+# The BM25 postings are saved next to the Chroma store and keyed by a hash of
+# the collection's chunk ids (which are content hashes), so they are only
+# rebuilt when the indexed documents change.  Hashing every id is a full scan,
+# so refresh() only does it when the chunk count or the ragindex manifest
+# (rewritten by ingest.py after every file it indexes) has changed.
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its my of on or "
+    "our so than that the their there these this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]  # "periods" -> "period", "benefits" -> "benefit"
+        tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; close enough for budgeting.
+    return max(1, len(text) // 4)
+
+
+def fingerprint(ids: list[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(ids)).encode()).hexdigest()
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of chunks, with postings that can be saved to disk."""
+
+    def __init__(self, ids: list[str], documents: list[str], metadatas: list[dict],
+                 postings: dict[str, list[list[int]]], lengths: list[int], k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings = postings  # term -> [[doc index, term frequency], ...]
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.fingerprint = fingerprint(ids)
+        self._avgdl = (sum(lengths) / len(lengths)) if lengths else 1.0
+
+    @classmethod
+    def build(cls, ids: list[str], documents: list[str], metadatas: list[dict]) -> "BM25Index":
+        postings: dict[str, list[list[int]]] = defaultdict(list)
+        lengths = []
+        for i, doc in enumerate(documents):
+            terms = Counter(tokenize(doc or ""))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                postings[term].append([i, tf])
+        return cls(list(ids), list(documents), [m or {} for m in metadatas], dict(postings), lengths)
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """(doc index, score) of the k best-scoring chunks."""
+        n = len(self.ids)
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / self._avgdl)
+                scores[i] += idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str) -> None:
+        data = {
+            "fingerprint": self.fingerprint,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "postings": self.postings,
+            "lengths": self.lengths,
+        }
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".bm25.")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index | None":
+        try:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, OSError):
+            logger.warning("Ignoring unreadable BM25 index at %s", path)
+            return None
+        return cls(data["ids"], data["documents"], data["metadatas"], data["postings"], data["lengths"])
+
+
+@dataclass
+class Hit:
+    id: str
+    text: str
+    metadata: dict
+    lexical_rank: int | None = None
+    vector_rank: int | None = None
+    score: float = 0.0
+
+
+class HybridRetriever:
+    """
+    BM25 + vector search over one Chroma collection, fused, reranked and
+    packed into `token_budget` tokens.
+
+    `collection` must carry the embedding function its vectors were made
+    with, so that `query_texts` are embedded by the same model.
+    `manifest_path` is the ragindex manifest of whatever writes to it.
+    """
+
+    def __init__(self, collection, index_path: str | None = None, candidates: int = 20,
+                 rerank_top: int = 12, rrf_k: int = 60, token_budget: int = 1200,
+                 manifest_path: str = MANIFEST_PATH):
+        self.collection = collection
+        self.index_path = index_path or os.path.join(DB_DIR, f"bm25-{collection.name}.json")
+        self.manifest_path = manifest_path
+        self.candidates = candidates
+        self.rerank_top = rerank_top
+        self.rrf_k = rrf_k
+        self.token_budget = token_budget
+        self._index: BM25Index | None = None
+        self._count = -1
+        self._stamp: tuple | None = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> BM25Index:
+        """The BM25 index for the collection's current contents, rebuilding it only if they changed."""
+        with self._lock:
+            stamp = self._current_stamp()
+            if self._index is not None and stamp == self._stamp:
+                return self._index
+            # Ids are content hashes, so this also catches chunks replaced one for one.
+            ids = self.collection.get(include=[])["ids"]
+            current = fingerprint(ids)
+            if self._index is not None and self._index.fingerprint == current:
+                self._stamp = stamp
+                return self._index
+            index = BM25Index.load(self.index_path)
+            if index is None or index.fingerprint != current:
+                data = self.collection.get(include=["documents", "metadatas"])
+                index = BM25Index.build(data["ids"], data["documents"], data["metadatas"])
+                index.save(self.index_path)
+                logger.info("Built BM25 index over %d chunks at %s", len(index.ids), self.index_path)
+            self._index, self._count, self._stamp = index, len(index.ids), stamp
+            return index
+
+    def _current_stamp(self) -> tuple:
+        # The manifest is replaced (new inode) on every write.
+        try:
+            st = os.stat(self.manifest_path)
+            manifest = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            manifest = None
+        return self.collection.count(), manifest
+
+    def search(self, query: str) -> list[Hit]:
+        index = self.refresh()
+        hits: dict[str, Hit] = {}
+
+        with tracer.start_as_current_span("retrieval bm25") as span:
+            for rank, (i, _) in enumerate(index.search(query, self.candidates)):
+                hits[index.ids[i]] = Hit(index.ids[i], index.documents[i], index.metadatas[i], lexical_rank=rank)
+            span.set_attribute("retrieval.hits", len(hits))
+
+        if self._count > 0:
+            # Includes embedding the query with the collection's embedding function.
+            with tracer.start_as_current_span("retrieval chroma.query"):
+                found = self.collection.query(query_texts=[query], n_results=min(self.candidates, self._count),
+                                              include=["documents", "metadatas"])
+            for rank, (chunk_id, text, metadata) in enumerate(
+                    zip(found["ids"][0], found["documents"][0], found["metadatas"][0])):
+                hit = hits.setdefault(chunk_id, Hit(chunk_id, text or "", metadata or {}))
+                hit.vector_rank = rank
+
+        for hit in hits.values():
+            hit.score = sum(1 / (self.rrf_k + r + 1) for r in (hit.lexical_rank, hit.vector_rank) if r is not None)
+        fused = sorted(hits.values(), key=lambda h: h.score, reverse=True)[:self.rerank_top]
+        return self._rerank(query, fused)
+
+    def _rerank(self, query: str, hits: list[Hit]) -> list[Hit]:
+        # Boost chunks that contain more of the query's terms, and its phrases in order.
+        terms = tokenize(query)
+        distinct = set(terms)
+        phrases = set(zip(terms, terms[1:]))
+        for hit in hits:
+            tokens = tokenize(hit.text)
+            coverage = len(distinct & set(tokens)) / len(distinct) if distinct else 0.0
+            phrase = len(phrases & set(zip(tokens, tokens[1:]))) / len(phrases) if phrases else 0.0
+            hit.score *= 1 + coverage + phrase
+        return sorted(hits, key=lambda h: h.score, reverse=True)
+
+    def pack(self, hits: list[Hit], token_budget: int | None = None) -> list[Hit]:
+        """Best hits that fit the budget; a chunk that only partly fits is cut at a word boundary."""
+        budget = token_budget or self.token_budget
+        packed, used = [], 0
+        for hit in hits:
+            room = budget - used
+            if room < 64:
+                break
+            cost = estimate_tokens(hit.text)
+            if cost > room:
+                hit.text = hit.text[:room * 4].rsplit(" ", 1)[0] + " …"
+                cost = estimate_tokens(hit.text)
+            packed.append(hit)
+            used += cost
+        return packed
+
+    def context(self, query: str, token_budget: int | None = None) -> str:
+        hits = self.pack(self.search(query), token_budget)
+        tokens = sum(estimate_tokens(h.text) for h in hits)
+        span = trace.get_current_span()
+        span.set_attribute("retrieval.chunks", len(hits))
+        span.set_attribute("retrieval.context_tokens", tokens)
+        logger.debug("Policy context for %r: %d chunks, ~%d tokens", query, len(hits), tokens)
+        return "\n\n".join(f"[{n}] {label(hit.metadata)}\n{hit.text}" for n, hit in enumerate(hits, 1))
+
+
+def label(metadata: dict) -> str:
+    source = os.path.basename(str(metadata.get("url", ""))) or "policy"
+    page = metadata.get("page")
+    return f"{source} p.{int(page) + 1}" if isinstance(page, (int, float)) else source
+
+
+class PolicySearchInput(BaseModel):
+    query: str = Field(..., description="What to look up, e.g. 'waiting period rehabilitation'")
+
+
+class PolicySearchTool(BaseTool):
+    """
+    CrewAI tool over a HybridRetriever: takes a plain query string and returns
+    numbered policy excerpts, labelled with document and page.
+    """
+    name: str = "policy_search"
+    description: str = ("Search the insurance policy documents. Use the exact terms you are looking for "
+                        "(benefit names, 'waiting period', 'excess', ...). Returns numbered policy excerpts "
+                        "with their page.")
+    args_schema: type[BaseModel] = PolicySearchInput
+    retriever: Any = Field(exclude=True)
+
+    def _run(self, query: str) -> str:
+        with timed("retrieval"), tool_span(self.name, **{"tool.input": query}):
+            return self.retriever.context(query) or "No matching policy text found."
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+from acp_sdk.models import MessagePart
+
+# Progress parts share the run's output stream with the final answer. They are
+# JSON objects with a "kind" (step, tool_call, snippet, delta, ...) and are told
+# apart from the answer, which stays text/plain, by their content type.
+#
+# acp_sdk keeps every yielded part: a run's output (run_sync, GET /runs/{id},
+# session history) is one message holding the progress parts followed by the
+# answer message, so the answer is run.output[-1].  Token deltas go through a
+# DeltaBuffer so that message holds a few dozen parts rather than one per token.
+PROGRESS_CONTENT_TYPE = "application/x-acp-progress+json"
+
+_CLOSED = object()
+
+
+def progress_part(kind: str, **data: Any) -> MessagePart:
+    return MessagePart(
+        content=json.dumps({"kind": kind, **data}, default=str),
+        content_type=PROGRESS_CONTENT_TYPE,
+    )
+
+
+def parse_progress(part: MessagePart) -> dict[str, Any] | None:
+    """The progress payload of `part`, or None if it is ordinary content."""
+    if part.content_type != PROGRESS_CONTENT_TYPE or part.content is None:
+        return None
+    return json.loads(part.content)
+
+
+def clip(text: Any, limit: int = 500) -> str:
+    text = str(text)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class DeltaBuffer:
+    """
+    Merges consecutive "delta" progress parts into one part per `max_chars`
+    characters or `max_delay` seconds of text.  Any other part flushes the
+    buffered text first, so ordering is preserved.
+    """
+
+    def __init__(self, max_chars: int = 400, max_delay: float = 0.5):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._pending: list[str] = []
+        self._size = 0
+        self._started = 0.0
+
+    def push(self, part: MessagePart | None) -> list[MessagePart]:
+        """The parts to yield now that `part` arrived (possibly none)."""
+        if part is None:
+            return []
+        progress = parse_progress(part)
+        if progress is None or progress["kind"] != "delta":
+            return self.flush() + [part]
+        if not self._pending:
+            self._started = time.monotonic()
+        self._pending.append(progress.get("content") or "")
+        self._size += len(self._pending[-1])
+        if self._size >= self.max_chars or time.monotonic() - self._started >= self.max_delay:
+            return self.flush()
+        return []
+
+    def flush(self) -> list[MessagePart]:
+        if not self._pending:
+            return []
+        part = progress_part("delta", content="".join(self._pending))
+        self._pending, self._size = [], 0
+        return [part]
+
+
+class ProgressChannel:
+    """
+    Hands items from worker threads (agent runs, crew callbacks) to the event
+    loop. `put` and `close` are safe to call from any thread; iterate with
+    `async for` or `get` on the loop the channel was created on.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, item: Any) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def close(self, error: BaseException | None = None) -> None:
+        self.put(error if error is not None else _CLOSED)
+
+    async def get(self, timeout: float | None = None) -> Any:
+        """Next item; raises StopAsyncIteration once closed, or the error passed to close()."""
+        item = await asyncio.wait_for(self._queue.get(), timeout)
+        if item is _CLOSED:
+            self._queue.put_nowait(_CLOSED)
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            self._queue.put_nowait(item)
+            raise item
+        return item
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.get()
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from opentelemetry import trace
+from opentelemetry.trace import Span
+
+import timings
+
+# Tracing and metrics for the ACP agents.
+#
+# Spans go through the OpenTelemetry API: with no SDK configured they are
+# no-ops, and `server.run(configure_telemetry=True)` (done when
+# OTEL_EXPORTER_OTLP_ENDPOINT is set) exports them over OTLP.  Agent, tool
+# and LLM spans nest under acp_sdk's own "run" span; worker threads pick up
+# the run's context because they are started with a copy of it.
+#
+# Metrics are kept in-process and served in the Prometheus text format on
+# /metrics of the agent server itself (acpmetrics.mount_metrics()), so whatever
+# can reach the agents can scrape them.  Components with their own counters (pool,
+# answer cache, DB writes) register a stats callback instead of duplicating them.
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("acpmcp")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(names: tuple[str, ...], values: dict[str, Any]) -> tuple[str, ...]:
+    return tuple(str(values.get(n, "")) for n in names)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    def __init__(self, name: str, help: str, kind: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, "counter", labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in values.items()]
+
+
+class Gauge(Metric):
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, "gauge", labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def add(self, amount: float, **labels: Any) -> None:
+        key = _labels(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[_labels(self.labels, labels)] = value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in values.items()]
+
+
+class Histogram(Metric):
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, "histogram", labels)
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list[float]] = {}  # bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(self.labels, labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        lines = []
+        names = self.labels + ("le",)
+        for key, series in snapshot.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (f'{bound:g}',))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._stats: list[tuple[str, Callable[[], dict[str, Any]], dict[str, str], frozenset[str]]] = []
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict[str, Any]],
+                       labels: dict[str, str] | None = None, counters: Iterable[str] = ()) -> None:
+        """Expose each numeric key of `stats()` as `<prefix>_<key>`; keys in `counters` are monotonic."""
+        self._stats.append((prefix, stats, labels or {}, frozenset(counters)))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.header() + metric.render()
+        for prefix, stats, labels, counters in self._stats:
+            try:
+                values = stats()
+            except Exception:
+                logger.exception("Stats callback for %s failed", prefix)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                kind = "counter" if key in counters else "gauge"
+                name = f"{prefix}_{key}" + ("_total" if kind == "counter" else "")
+                lines += [f"# TYPE {name} {kind}",
+                          f"{name}{_format_labels(labels.keys(), labels.values())} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+run_seconds = registry.histogram("acp_run_duration_seconds", "ACP agent run latency", ("agent", "status"))
+run_phase_seconds = registry.histogram("acp_run_phase_seconds", "Time per run spent in each phase",
+                                       ("agent", "phase"))
+runs_in_flight = registry.gauge("acp_runs_in_flight", "ACP agent runs currently executing", ("agent",))
+tool_seconds = registry.histogram("acp_tool_duration_seconds", "Tool call latency", ("tool", "status"))
+llm_seconds = registry.histogram("acp_llm_request_duration_seconds", "LLM request latency", ("model", "status"))
+llm_tokens = registry.counter("acp_llm_tokens_total", "LLM tokens used", ("agent", "kind"))
+retries = registry.counter("acp_retries_total", "Retried tool calls, failed agent steps and LLM errors",
+                           ("agent", "kind"))
+
+
+class RunTelemetry:
+    """Token and retry totals for one run, attached to its span when the run ends."""
+
+    def __init__(self, agent: str, span: Span):
+        self.agent = agent
+        self.span = span
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.retries: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+
+_run: ContextVar[RunTelemetry | None] = ContextVar("run_telemetry", default=None)
+
+
+@contextmanager
+def track_run(agent: str, **attributes: Any) -> Iterator[Span]:
+    """Span, in-flight gauge and latency histogram around one ACP run."""
+    status = "completed"
+    started = time.perf_counter()
+    runs_in_flight.add(1, agent=agent)
+    with tracer.start_as_current_span(f"agent {agent}", attributes={"acp.agent": agent, **attributes}) as span:
+        run = RunTelemetry(agent, span)
+        token = _run.set(run)
+        try:
+            yield span
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            try:
+                _run.reset(token)
+            except ValueError:
+                pass  # generator finalized from another context
+            runs_in_flight.add(-1, agent=agent)
+            elapsed = time.perf_counter() - started
+            run_seconds.observe(elapsed, agent=agent, status=status)
+            with run._lock:
+                span.set_attribute("llm.tokens.prompt", run.tokens["prompt"])
+                span.set_attribute("llm.tokens.completion", run.tokens["completion"])
+                for kind, count in run.retries.items():
+                    span.set_attribute(f"retries.{kind}", count)
+            current = timings.current()
+            if current is not None:
+                for phase, seconds in current.seconds.items():
+                    run_phase_seconds.observe(seconds, agent=agent, phase=phase)
+
+
+def note_tokens(prompt: int = 0, completion: int = 0) -> None:
+    run = _run.get()
+    agent = run.agent if run else ""
+    llm_tokens.inc(prompt, agent=agent, kind="prompt")
+    llm_tokens.inc(completion, agent=agent, kind="completion")
+    if run is not None:
+        with run._lock:
+            run.tokens["prompt"] += prompt
+            run.tokens["completion"] += completion
+
+
+def note_retry(kind: str, error: Any = None) -> None:
+    run = _run.get()
+    retries.inc(agent=run.agent if run else "", kind=kind)
+    if run is not None:
+        with run._lock:
+            run.retries[kind] = run.retries.get(kind, 0) + 1
+        run.span.add_event("retry", {"kind": kind, "error": str(error)[:500]})
+
+
+@contextmanager
+def tool_span(tool: str, **attributes: Any) -> Iterator[Span]:
+    status = "ok"
+    started = time.perf_counter()
+    with tracer.start_as_current_span(f"tool {tool}", attributes={"tool.name": tool, **attributes}) as span:
+        try:
+            yield span
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            tool_seconds.observe(time.perf_counter() - started, tool=tool, status=status)
+
+
+@contextmanager
+def llm_span(model: str, **attributes: Any) -> Iterator[Span]:
+    status = "ok"
+    started = time.perf_counter()
+    with tracer.start_as_current_span(f"llm {model}", attributes={"llm.model": model, **attributes}) as span:
+        try:
+            yield span
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            llm_seconds.observe(time.perf_counter() - started, model=model, status=status)
+
+
+def otlp_enabled() -> bool:
+    """Whether to let acp_sdk install its OTLP exporters (server.run(configure_telemetry=...))."""
+    return bool(os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"))
@@ -0,0 +1,76 @@
+import json
+import sqlite3
+
+import pytest
+
+pytest.importorskip("crewai")
+
+import sqlwrite
+from sqlwrite import ConnectionPool, PostgresWriteTool, connect_from_url
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "visits.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE visits (user_id INTEGER NOT NULL, note TEXT)")
+    pool = ConnectionPool(connect_from_url(f"sqlite:///{path}"), minconn=1, maxconn=2)
+    monkeypatch.setattr(sqlwrite, "_pool", pool)
+    yield path
+    pool.close()
+
+
+def rows(path) -> list[tuple]:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT user_id, note FROM visits ORDER BY user_id").fetchall()
+
+
+def write(payload: dict) -> str:
+    return PostgresWriteTool()._run(json.dumps(payload))
+
+
+def test_single_statement(db):
+    result = write({"sql": "INSERT INTO visits (user_id, note) VALUES (%s, %s)", "params": [42, "check-up"]})
+
+    assert result.startswith("rows_affected=1 statements=1")
+    assert rows(db) == [(42, "check-up")]
+
+
+@pytest.mark.parametrize("sql", [
+    "INSERT INTO visits (user_id, note) VALUES %s",
+    "INSERT INTO visits (user_id, note) VALUES (%s, %s)",
+])
+def test_rows_are_batched(db, sql):
+    result = write({"sql": sql, "rows": [[42, "check-up"], [43, "x-ray"], [44, "50% off"]]})
+
+    assert result.startswith("rows_affected=3 statements=3")
+    assert rows(db) == [(42, "check-up"), (43, "x-ray"), (44, "50% off")]
+
+
+def test_statements_roll_back_together(db):
+    with pytest.raises(sqlite3.IntegrityError):
+        write({"statements": [
+            {"sql": "INSERT INTO visits (user_id, note) VALUES (%s, %s)", "params": [42, "check-up"]},
+            {"sql": "INSERT INTO visits (user_id, note) VALUES %s", "rows": [[43, "x-ray"], [None, "bad"]]},
+        ]})
+
+    assert rows(db) == []
+    assert sqlwrite._pool.stats()["open"] == 1
+
+
+def test_pool_replaces_connection_that_fails_health_check(tmp_path):
+    opened = []
+
+    def connect():
+        conn = connect_from_url(f"sqlite:///{tmp_path / 'pool.db'}")()
+        opened.append(conn)
+        return conn
+
+    pool = ConnectionPool(connect, minconn=1, maxconn=1, check_after=0)
+    opened[0].close()  # e.g. the server dropped it while idle
+
+    with pool.connection() as conn:
+        assert conn is not opened[0]
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    assert len(opened) == 2
+    assert pool.stats() == {"open": 1, "idle": 1, "max": 1}
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from acp_sdk.models import MessagePart
+
+from streaming import progress_part
+
+# Where a single ACP run spent its time.
+#
+# Each agent starts a RunTimings at the top of the run; code deeper down (the
+# agent pool, the retrieval tool, the LLM wrappers) adds to it through the
+# context variable, including from worker threads that were started with a
+# copy of the run's context.  The totals go out as a "timing" progress part
+# just before the answer, which is what bench.py aggregates.
+
+PHASES = ("queue", "retrieval", "llm")
+
+_current: ContextVar["RunTimings | None"] = ContextVar("run_timings", default=None)
+
+
+class RunTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def part(self, **extra) -> MessagePart:
+        total = time.perf_counter() - self.started
+        with self._lock:
+            phases = {f"{p}_ms": round(s * 1000, 1) for p, s in self.seconds.items()}
+            calls = {f"{p}_calls": n for p, n in self.calls.items()}
+        return progress_part("timing", total_ms=round(total * 1000, 1), **phases, **calls, **extra)
+
+
+def start_run() -> RunTimings:
+    """Begin timing the current run; phases recorded in this context (and copies of it) add to it."""
+    timings = RunTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> RunTimings | None:
+    return _current.get()
+
+
+def record(phase: str, seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
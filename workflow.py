@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import httpx
+from acp_sdk.client import Client
+from acp_sdk.models import (
+    Message,
+    MessageCompletedEvent,
+    MessagePartEvent,
+    Run,
+    RunCancelledEvent,
+    RunCompletedEvent,
+    RunFailedEvent,
+    RunStatus,
+)
+
+from streaming import parse_progress
+
+logger = logging.getLogger(__name__)
+
+# A node's input is either a fixed prompt or built from its dependencies' outputs.
+NodeInput = str | Callable[[dict[str, str]], str]
+# Called with (node name, progress payload) for every progress part a streaming node receives.
+ProgressHandler = Callable[[str, dict], None]
+
+
+@dataclass
+class Node:
+    """One ACP agent call in a workflow."""
+
+    name: str
+    agent: str
+    base_url: str
+    input: NodeInput
+    deps: tuple[str, ...] = ()
+    timeout: float | None = None
+    retries: int = 0
+    stream: bool = False
+    # Streaming only: release dependents once this many characters of "answer" progress (text
+    # of the final answer, streamed by agents that produce it incrementally) have arrived, with
+    # that partial text as the node's output.  "delta" parts are never forwarded: they are the
+    # model's raw output for every step, scratch work included.  The final answer replaces the
+    # partial text in the node's result, but dependents that already started keep it.
+    partial_chars: int | None = None
+
+
+@dataclass
+class NodeResult:
+    name: str
+    status: str = "pending"  # completed | failed | skipped
+    output: str | None = None
+    partial: bool = False  # output is only the start of the answer (see Node.partial_chars)
+    error: BaseException | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+
+def answer_text(messages: list[Message]) -> str:
+    """Plain-text content of an agent's final message."""
+    if not messages:
+        return ""
+    parts = messages[-1].parts
+    return "".join(p.content or "" for p in parts if (p.content_type or "text/plain") == "text/plain")
+
+
+def raise_for_status(run: Run) -> Run:
+    # Run.raise_for_status() turns a cancelled run into asyncio.CancelledError,
+    # which would look like *our* task being cancelled.
+    if run.status == RunStatus.CANCELLED:
+        raise RuntimeError(f"{run.agent_name} run {run.run_id} was cancelled")
+    return run.raise_for_status()
+
+
+def pooled_client(max_connections: int = 20, timeout: float | None = None) -> Client:
+    """One keep-alive HTTP pool shared by every node; nodes pick their server via base_url."""
+    return Client(
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+class Workflow:
+    """
+    Runs a DAG of ACP agent calls. Every node starts as soon as all of its
+    dependencies have completed, so independent branches run concurrently
+    and end-to-end latency follows the longest dependency chain.
+
+    A node that fails (after its retries) marks the nodes depending on it as
+    skipped; unrelated branches keep running.
+
+    Streaming nodes report progress parts as they arrive and release their
+    dependents as soon as the final answer message is complete, without
+    waiting for the rest of the run's event stream.  With `partial_chars`
+    they release them even earlier, with the part of the answer streamed so far.
+    """
+
+    def __init__(self, nodes: list[Node], backoff: float = 0.5):
+        self.nodes = {n.name: n for n in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Workflow node names must be unique")
+        self.backoff = backoff
+        self._check_graph()
+
+    async def run(self, client: Client,
+                  on_result: Callable[[NodeResult], None] | None = None,
+                  on_progress: ProgressHandler | None = None) -> dict[str, NodeResult]:
+        results = {name: NodeResult(name) for name in self.nodes}
+        done = {name: asyncio.Event() for name in self.nodes}
+
+        async def visit(node: Node) -> None:
+            result = results[node.name]
+            for dep in node.deps:
+                await done[dep].wait()
+            failed = [d for d in node.deps if results[d].status != "completed"]
+            try:
+                if failed:
+                    result.status = "skipped"
+                    logger.warning("Skipping %s: dependencies %s did not complete", node.name, failed)
+                else:
+                    upstream = {d: results[d].output for d in node.deps}
+                    await self._call(client, node, upstream, result, done[node.name].set, on_progress)
+            except Exception as exc:
+                result.status, result.error = "failed", exc
+            finally:
+                done[node.name].set()
+            if on_result is not None:
+                on_result(result)
+
+        await asyncio.gather(*(visit(n) for n in self.nodes.values()))
+        return results
+
+    async def _call(self, client: Client, node: Node, upstream: dict[str, str], result: NodeResult,
+                    ready: Callable[[], None], on_progress: ProgressHandler | None) -> None:
+        prompt = node.input(upstream) if callable(node.input) else node.input
+        started = time.perf_counter()
+        for attempt in range(node.retries + 1):
+            result.attempts = attempt + 1
+            try:
+                async with asyncio.timeout(node.timeout):
+                    if node.stream:
+                        await self._stream(client, node, prompt, result, ready, on_progress)
+                    else:
+                        run: Run = await client.run_sync(prompt, agent=node.agent, base_url=node.base_url)
+                        raise_for_status(run)
+                        result.output = answer_text(run.output)
+                result.status = "completed"
+                result.error = None
+                break
+            except Exception as exc:
+                if result.status == "completed" and result.partial:
+                    # Dependents already started on the partial answer and keep running, but this
+                    # node never produced its answer.  Retrying would not reach them either.
+                    result.status, result.error = "failed", exc
+                    logger.warning("%s failed after its partial answer was forwarded: %r", node.name, exc)
+                    break
+                if result.status == "completed":
+                    # The answer was already handed downstream; keep it.
+                    logger.warning("%s failed after its answer was forwarded: %r", node.name, exc)
+                    break
+                result.status, result.error = "failed", exc
+                logger.warning("%s attempt %d/%d failed: %r", node.name, attempt + 1, node.retries + 1, exc)
+                if attempt < node.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+        result.elapsed = time.perf_counter() - started
+
+    async def _stream(self, client: Client, node: Node, prompt: str, result: NodeResult,
+                      ready: Callable[[], None], on_progress: ProgressHandler | None) -> None:
+        partial: list[str] = []
+        partial_len = 0
+        final = False
+        async for event in client.run_stream(prompt, agent=node.agent, base_url=node.base_url):
+            if isinstance(event, MessagePartEvent):
+                progress = parse_progress(event.part)
+                if progress is None:
+                    continue
+                if on_progress is not None:
+                    on_progress(node.name, progress)
+                if node.partial_chars and progress["kind"] == "answer" and result.status != "completed":
+                    partial.append(progress.get("content") or "")
+                    partial_len += len(partial[-1])
+                    if partial_len >= node.partial_chars:
+                        result.output, result.status, result.partial = "".join(partial), "completed", True
+                        ready()
+            elif isinstance(event, MessageCompletedEvent):
+                text = answer_text([event.message])
+                if text and not final:
+                    result.output, result.status, result.partial, final = text, "completed", False, True
+                    ready()
+            elif isinstance(event, (RunCompletedEvent, RunFailedEvent, RunCancelledEvent)):
+                raise_for_status(event.run)
+                text = answer_text(event.run.output)
+                if text and not final:
+                    result.output, result.partial = text, False
+
+    def _check_graph(self) -> None:
+        state: dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def walk(name: str, path: tuple[str, ...]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Workflow has a cycle: {' -> '.join(path + (name,))}")
+            state[name] = 1
+            for dep in self.nodes[name].deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"Node {name!r} depends on unknown node {dep!r}")
+                walk(dep, path + (name,))
+            state[name] = 2
+
+        for name in self.nodes:
+            walk(name, ())
+